@@ -1,17 +1,36 @@
 import sys
+import functools
+import threading
 import numpy as np
 import sounddevice as sd
 import soundfile as sf
+from scipy.fft import rfft
 from scipy.signal import bessel, sosfilt
+try:
+    from numba import njit, void, float32 as f4, float64 as f8
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+try:
+    import pyfftw
+    HAS_PYFFTW = True
+except ImportError:
+    HAS_PYFFTW = False
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QSlider, QVBoxLayout, 
                              QHBoxLayout, QWidget, QLabel, QPushButton, 
                              QFileDialog, QFrame, QComboBox, QCheckBox)
-from PyQt6.QtCore import Qt, pyqtSignal, QObject
+from PyQt6.QtCore import Qt, QObject, QTimer
 from PyQt6.QtGui import QPainter, QColor, QLinearGradient, QFont
 
 # --- Audio Constants ---
 BLOCK_SIZE = 2048
 BANDS = [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
+NBANDS = len(BANDS)
+NCH = 2   # output stream channels
+NSEC = 2  # a 2nd-order Bessel bandpass is a 4th-order filter: two biquad sections
+VIZ_BARS = 60
+RING_BLOCKS = 2  # processed blocks buffered ahead of the audio callback (~93 ms at 44.1 kHz)
+COMMON_RATES = (44100, 48000, 88200, 96000)
 
 # --- Presets Data ---
 PRESETS = {
@@ -24,101 +43,231 @@ PRESETS = {
     "Vocal": [-3, -2, -1, 1, 3, 4, 4, 3, 1, -1]
 }
 
-class AudioWorker(QObject):
-    spectrum_ready = pyqtSignal(np.ndarray)
+@functools.lru_cache(maxsize=8)
+def _design_bank(fs):
+    edges = np.outer(BANDS, [0.707, 1.414])
+    # Keep the top edge well below Nyquist; right at fs/2 the 16K band gets a pole
+    # a hair inside the unit circle that rounding can push onto it
+    np.minimum(edges[:, 1], 0.45 * fs, out=edges[:, 1])
+    # Coefficients and filter state stay float64: the state runs for the whole track,
+    # so even a slightly mis-rounded pole would build up without bound
+    sos_stack = np.empty((NBANDS, NSEC, 6), dtype=np.float64)
+    for i, freq in enumerate(BANDS):
+        sos = bessel(2, edges[i].tolist(), btype='bandpass', fs=fs, output='sos')
+        if sos.shape[0] != NSEC:
+            raise ValueError(f"expected {NSEC} SOS sections for {freq} Hz band, got {sos.shape[0]}")
+        sos_stack[i] = sos
+        radius = max(np.abs(np.roots(section[3:])).max() for section in sos_stack[i])
+        if radius >= 1.0:
+            raise ValueError(f"{freq} Hz band at {fs} Hz is not stable (pole radius {radius})")
+    # Read-only so the cached design can't be altered; workers take a writable copy
+    # because the kernel's contiguous-array signature does not accept read-only arrays
+    sos_stack.flags.writeable = False
+    return sos_stack
+
+def _warm_designs():
+    for fs in COMMON_RATES:
+        _design_bank(fs)
+
+_warm_designs()
+
+if HAS_NUMBA:
+    # The explicit signature makes Numba compile (or load from the on-disk cache) at
+    # import time, so the audio path never waits on the JIT
+    @njit(void(f4[:, ::1], f8[:, :, ::1], f4[::1], f4, f8[:, :, :, ::1], f4[:, ::1]),
+          cache=True, fastmath=True, boundscheck=False, nogil=True)
+    def _apply_bank(x, sos_stack, gains_linear, preamp, zi, out):
+        """Run every band over the block in one pass (DF-II transposed, like scipy's sosfilt)
+        and write the (unclipped) mix straight into out.
+
+        The band/section/channel counts are module constants so LLVM sees fixed trip
+        counts and can unroll the inner loops. The GIL is released for the whole block."""
+        for n in range(x.shape[0]):
+            for c in range(NCH):
+                x_in = preamp * x[n, c]
+                acc = x_in
+                for b in range(NBANDS):
+                    x_cur = x_in
+                    for s in range(NSEC):
+                        x_new = sos_stack[b, s, 0] * x_cur + zi[b, s, 0, c]
+                        zi[b, s, 0, c] = (sos_stack[b, s, 1] * x_cur - sos_stack[b, s, 4] * x_new
+                                          + zi[b, s, 1, c])
+                        zi[b, s, 1, c] = sos_stack[b, s, 2] * x_cur - sos_stack[b, s, 5] * x_new
+                        x_cur = x_new
+                    acc += gains_linear[b] * x_cur
+                out[n, c] = acc
+else:
+    def _apply_bank(x, sos_stack, gains_linear, preamp, zi, out):
+        """Same contract as the Numba kernel, built on scipy's compiled sosfilt.
+        sosfilt takes one coefficient set per call, so bands are still filtered one
+        by one, but the band sum is a single einsum. Every band reads the same scaled
+        block; it is never tiled per band."""
+        scaled = preamp * x
+        filtered = np.empty((sos_stack.shape[0],) + x.shape, dtype=np.float32)
+        for b in range(sos_stack.shape[0]):
+            filtered[b], zi[b] = sosfilt(sos_stack[b], scaled, axis=0, zi=zi[b])
+        np.einsum('bnc,b->nc', filtered, gains_linear, out=out)
+        out += scaled
 
+class AudioWorker(QObject):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.data = None
         self.fs = 44100
         self.current_frame = 0
         self.is_playing = False
-        self.gains = np.zeros(len(BANDS))
+        self.gains = np.zeros(len(BANDS), dtype=np.float32)
         self.preamp = 1.0
         self.master_vol = 0.8
         self.bass_boost = 0.0  
         self.treble_boost = 0.0 
         self.is_bass_booster_active = False
-        self.sos_filters = []
-
-    def load_file(self, path):
-        self.data, self.fs = sf.read(path, always_2d=True)
-        self.current_frame = 0
+        self._linear_gains = np.zeros(len(BANDS), dtype=np.float32)
+        self._win = np.hanning(BLOCK_SIZE).astype(np.float32)
+        self._mono_buf = np.empty(BLOCK_SIZE, dtype=np.float32)
+        if HAS_PYFFTW:
+            # Plan once for the fixed block size; the plan reuses these aligned buffers
+            self._fft_in = pyfftw.empty_aligned(BLOCK_SIZE, dtype='float32')
+            self._fft_out = pyfftw.empty_aligned(BLOCK_SIZE // 2 + 1, dtype='complex64')
+            self._fft = pyfftw.FFTW(self._fft_in, self._fft_out, flags=('FFTW_MEASURE',))
+        else:
+            self._fft_in = np.empty(BLOCK_SIZE, dtype=np.float32)
+            self._fft = lambda: rfft(self._fft_in, overwrite_x=True, workers=1)
+        self._viz_idx = np.geomspace(1, BLOCK_SIZE // 2, VIZ_BARS).astype(np.int32)
+        # Low bins collapse onto the same integer; bump them so every bar is distinct.
+        for i in range(1, VIZ_BARS):
+            self._viz_idx[i] = max(self._viz_idx[i], self._viz_idx[i - 1] + 1)
+        # Latest spectrum only; written by the DSP thread, polled by the GUI timer
+        self._spec_buf = np.zeros(VIZ_BARS, dtype=np.float32)
         self._update_filters()
 
-    def _update_filters(self):
-        self.sos_filters = []
-        for freq in BANDS:
-            low = freq * 0.707
-            high = min(freq * 1.414, self.fs / 2 - 1)
-            sos = bessel(2, [low, high], btype='bandpass', fs=self.fs, output='sos')
-            self.sos_filters.append(sos)
+        # Single-producer/single-consumer ring of filtered, unclipped blocks. Only the DSP
+        # thread advances _ring_write and only the audio callback advances _ring_read.
+        # Output volume and clipping are left to the callback so the OUTPUT slider acts
+        # immediately and still gives headroom before the clip.
+        self._ring = np.zeros((RING_BLOCKS, BLOCK_SIZE, NCH), dtype=np.float32)
+        self._cb_buf = np.empty((BLOCK_SIZE, NCH), dtype=np.float32)
+        self._ring_epoch = [0] * RING_BLOCKS
+        self._ring_read = 0
+        self._ring_write = 0
+        self._epoch = 0  # bumped on load so the callback skips blocks of the old file
+        self._at_end = False
+        self._lock = threading.Lock()  # held by the DSP thread per block and by load_file
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._dsp_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
 
-    def callback(self, outdata, frames, time, status):
-        if not self.is_playing or self.data is None:
-            outdata.fill(0)
-            return
+    def load_file(self, path):
+        data, fs = sf.read(path, always_2d=True, dtype='float32')
+        if data.shape[1] == 1:
+            data = np.repeat(data, 2, axis=1)
+        with self._lock:
+            self.data = np.ascontiguousarray(data)
+            self.fs = fs
+            self.current_frame = 0
+            self._update_filters()
+            self._epoch += 1
+            self._at_end = False
+        self._wake.set()
 
-        chunk_end = self.current_frame + frames
+    def _update_filters(self):
+        self.sos_stack = _design_bank(self.fs).copy()
+        self.zi_stack = np.zeros((NBANDS, NSEC, 2, NCH), dtype=np.float64)
+
+    def _recompute_linear_gains(self):
+        total_gains = self.gains.copy()
+        total_gains[:3] += self.bass_boost
+        if self.is_bass_booster_active:
+            total_gains[:3] += 8.0
+        total_gains[7:] += self.treble_boost
+        # Swap in a fresh array so the audio thread never sees a half-updated vector
+        self._linear_gains = (10**(total_gains/20) - 1).astype(np.float32)
+
+    def _dsp_loop(self):
+        while self._running:
+            self._wake.clear()
+            if (not self.is_playing or self.data is None or self._at_end
+                    or self._ring_write - self._ring_read >= RING_BLOCKS):
+                self._wake.wait(0.05)
+                continue
+            slot = self._ring_write % RING_BLOCKS
+            with self._lock:
+                if not self._process_block(self._ring[slot]):
+                    continue
+                self._ring_epoch[slot] = self._epoch
+            self._ring_write += 1
+
+    def _process_block(self, out):
+        chunk_end = self.current_frame + BLOCK_SIZE
         if chunk_end > len(self.data):
-            self.is_playing = False
-            return
+            self._at_end = True
+            return False
 
-        chunk = self.data[self.current_frame:chunk_end].copy()
-        chunk *= self.preamp
+        chunk = self.data[self.current_frame:chunk_end]
+        _apply_bank(chunk, self.sos_stack, self._linear_gains, self.preamp, self.zi_stack, out)
 
-        processed_chunk = chunk.copy()
-        
-        for i, sos in enumerate(self.sos_filters):
-            total_gain = self.gains[i]
-            if i <= 2:
-                total_gain += self.bass_boost
-                if self.is_bass_booster_active:
-                    total_gain += 8.0
-            if i >= 7:
-                total_gain += self.treble_boost
-
-            if total_gain != 0:
-                filtered = sosfilt(sos, chunk, axis=0)
-                linear_gain = 10**(total_gain/20) - 1
-                processed_chunk += filtered * linear_gain
-
-        processed_chunk *= self.master_vol
-        np.clip(processed_chunk, -1, 1, outdata)
-
-        avg_signal = np.mean(processed_chunk, axis=1)
-        fft_data = np.abs(np.fft.rfft(avg_signal * np.hanning(len(avg_signal))))
-        
-        # Safe check before emitting to avoid RuntimeError on shutdown
-        try:
-            self.spectrum_ready.emit(fft_data)
-        except RuntimeError:
-            pass
+        np.add(out[:, 0], out[:, 1], out=self._mono_buf)
+        self._mono_buf *= 0.5 * self.master_vol
+        np.multiply(self._mono_buf, self._win, out=self._fft_in)
+        fft_data = self._fft()
+        np.abs(fft_data[self._viz_idx], out=self._spec_buf)
             
-        self.current_frame += frames
+        self.current_frame = chunk_end
+        return True
+
+    def callback(self, outdata, frames, time, status):
+        # Runs on PortAudio's thread: only volume-scale and saturate a ready block into
+        # int16, all DSP is on _dsp_loop
+        out = np.frombuffer(outdata, dtype=np.int16).reshape(frames, NCH)
+        while (self._ring_read < self._ring_write
+               and self._ring_epoch[self._ring_read % RING_BLOCKS] != self._epoch):
+            self._ring_read += 1
+        if not self.is_playing or self._ring_read == self._ring_write:
+            if self._at_end and self._ring_read == self._ring_write:
+                self.is_playing = False
+            out.fill(0)
+            return
+
+        # Scale first, then saturate into int16, so turning the volume down avoids clipping
+        buf = self._cb_buf[:frames]
+        np.multiply(self._ring[self._ring_read % RING_BLOCKS, :frames],
+                    np.float32(self.master_vol * 32767), out=buf)
+        np.clip(buf, -32768, 32767, out=out, casting='unsafe')
+        self._ring_read += 1
+        self._wake.set()
 
 class Visualizer(QFrame):
     def __init__(self):
         super().__init__()
-        self.spectrum = np.zeros(60)
+        self._log_spec = [0.0] * VIZ_BARS
         self.setMinimumHeight(180)
         self.setStyleSheet("background-color: #1a1e2e; border-radius: 15px; border: 1px solid #2a314d;")
 
     def update_spectrum(self, data):
-        samples = 60
-        if len(data) > samples:
-            indices = np.linspace(0, len(data)-1, samples).astype(int)
-            self.spectrum = data[indices]
-            self.update()
+        # One vectorized log per frame; paintEvent then works on plain Python floats
+        self._log_spec = np.log10(data + 1, dtype=np.float32).tolist()
+        self.update()
 
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         w, h = self.width(), self.height()
-        bar_w = w / len(self.spectrum)
+        bar_w = w / len(self._log_spec)
 
-        for i, val in enumerate(self.spectrum):
-            bar_h = min(h - 20, (np.log10(val + 1) * h * 0.6))
+        for i, log_val in enumerate(self._log_spec):
+            bar_h = min(h - 20, log_val * h * 0.6)
             grad = QLinearGradient(0, h, 0, h - bar_h)
             grad.setColorAt(0, QColor(112, 0, 255, 180)) # Purple
             grad.setColorAt(1, QColor(0, 212, 255))      # Cyan
@@ -133,8 +282,9 @@ class EqualizerApp(QMainWindow):
         self.band_sliders = []
         self.init_ui()
         
-        self.stream = sd.OutputStream(
-            samplerate=44100, channels=2, blocksize=BLOCK_SIZE, 
+        self.worker.start()
+        self.stream = sd.RawOutputStream(
+            samplerate=44100, channels=2, blocksize=BLOCK_SIZE, dtype='int16',
             callback=self.worker.callback
         )
         self.stream.start()
@@ -214,7 +364,9 @@ class EqualizerApp(QMainWindow):
 
         # 2. Visualizer
         self.viz = Visualizer()
-        self.worker.spectrum_ready.connect(self.viz.update_spectrum)
+        self.viz_timer = QTimer(self.viz)
+        self.viz_timer.timeout.connect(self.poll_spectrum)
+        self.viz_timer.start(33)
         layout.addWidget(self.viz)
 
         # 3. Controls Area
@@ -228,11 +380,11 @@ class EqualizerApp(QMainWindow):
 
         self.bass_slider = QSlider(Qt.Orientation.Vertical)
         self.bass_slider.setRange(0, 15)
-        self.bass_slider.valueChanged.connect(lambda v: setattr(self.worker, 'bass_boost', v))
+        self.bass_slider.valueChanged.connect(self.update_bass)
         
         self.treble_slider = QSlider(Qt.Orientation.Vertical)
         self.treble_slider.setRange(0, 15)
-        self.treble_slider.valueChanged.connect(lambda v: setattr(self.worker, 'treble_boost', v))
+        self.treble_slider.valueChanged.connect(self.update_treble)
         
         self.boost_chk = QCheckBox("BOOST")
         self.boost_chk.stateChanged.connect(self.toggle_bass_booster)
@@ -295,12 +447,17 @@ class EqualizerApp(QMainWindow):
     def apply_preset(self, name):
         if name in PRESETS:
             preset_gains = PRESETS[name]
-            for i, gain in enumerate(preset_gains):
-                self.band_sliders[i].setValue(gain)
-                self.worker.gains[i] = gain
+            # Move the sliders without firing update_band once per band
+            for slider, gain in zip(self.band_sliders, preset_gains):
+                slider.blockSignals(True)
+                slider.setValue(gain)
+                slider.blockSignals(False)
+            self.worker.gains[:] = preset_gains
+            self.worker._recompute_linear_gains()
 
     def toggle_bass_booster(self, state):
         self.worker.is_bass_booster_active = (state == 2)
+        self.worker._recompute_linear_gains()
 
     def load_audio(self):
         path, _ = QFileDialog.getOpenFileName(self, "Open Audio", "", "Audio (*.wav *.flac *.mp3)")
@@ -311,18 +468,37 @@ class EqualizerApp(QMainWindow):
     def toggle_play(self):
         if self.worker.data is None: return
         self.worker.is_playing = not self.worker.is_playing
+        self.worker._wake.set()
         self.btn_play.setText("PAUSE ENGINE" if self.worker.is_playing else "START ENGINE")
 
+    def poll_spectrum(self):
+        # Nothing new is produced while stopped, so don't copy or repaint
+        if not self.worker.is_playing:
+            return
+        self.viz.update_spectrum(self.worker._spec_buf.copy())
+
     def update_preamp(self, val): self.worker.preamp = val / 50.0
     def update_master(self, val): self.worker.master_vol = val / 100.0
-    def update_band(self, index, val): self.worker.gains[index] = val
+    def update_band(self, index, val):
+        self.worker.gains[index] = val
+        self.worker._recompute_linear_gains()
+
+    def update_bass(self, val):
+        self.worker.bass_boost = val
+        self.worker._recompute_linear_gains()
+
+    def update_treble(self, val):
+        self.worker.treble_boost = val
+        self.worker._recompute_linear_gains()
 
     def closeEvent(self, event):
         """Cleanup audio stream before closing the window."""
         self.worker.is_playing = False
+        self.viz_timer.stop()
         if hasattr(self, 'stream') and self.stream:
             self.stream.stop()
             self.stream.close()
+        self.worker.stop()
         event.accept()
 
 if __name__ == "__main__":